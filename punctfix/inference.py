@@ -1,11 +1,14 @@
 from collections import Counter
-from dataclasses import dataclass
+from concurrent.futures import Future
+from dataclasses import dataclass, field
 from typing import Tuple, Dict, List, Union, Optional
+import copy
+import threading
 import warnings
 import re
 
 import torch
-from transformers import TokenClassificationPipeline
+from transformers import PreTrainedTokenizerFast, TokenClassificationPipeline
 
 from punctfix.models import get_custom_model_and_tokenizer, get_english_model_and_tokenizer, \
     get_danish_model_and_tokenizer, get_german_model_and_tokenizer
@@ -13,6 +16,15 @@ from punctfix.models import get_custom_model_and_tokenizer, get_english_model_an
 
 WORD_NORMALIZATION_PATTERN = re.compile(r"[\W_]+")
 
+class WordTokenClassificationPipeline(TokenClassificationPipeline):
+    """
+    Token classification pipeline returning an entity for each word instead of grouping adjacent words
+    with the same label, such that each word keeps its own score.
+    """
+
+    def group_entities(self, entities: List[dict]) -> List[dict]:
+        return [self.group_sub_entities([entity]) for entity in entities]
+
 class NoLanguageOrModelSelect(Exception):
     """
     Exception raised if you fail to specify either a language or custom model path.
@@ -31,6 +43,7 @@ class WordPrediction:
     """
     word: str
     labels: List[str]
+    scores: List[float] = field(default_factory=list)
 
     @property
     def label(self):
@@ -41,13 +54,63 @@ class WordPrediction:
         """
         return Counter(self.labels).most_common(1)[0][0]
 
+    @property
+    def confidence(self) -> float:
+        """
+        Mean model score of the predictions agreeing with the chosen label. 1.0 if no scores were recorded.
+
+        :return: Confidence as a float between 0 and 1
+        """
+        if not self.scores:
+            return 1.0
+        label = self.label
+        scores = [score for predicted, score in zip(self.labels, self.scores) if predicted == label]
+        return sum(scores) / len(scores)
 
-class PunctFixer:
+    @property
+    def is_conflicting(self) -> bool:
+        """
+        Whether the most common label is tied with another label i.e. the majority vote is arbitrary.
+
+        :return: True if the top labels are tied
+        """
+        top_labels = Counter(self.labels).most_common(2)
+        return len(top_labels) == 2 and top_labels[0][1] == top_labels[1][1]
+
+
+@dataclass
+class StructuredPunctuation:
+    """
+    Dataclass to hold the punctuation of a text as arrays with one entry per normalized word.
+    """
+    words: List[str]
+    # Index of each word in the list of words given as input
+    word_indices: torch.Tensor
+    # Index into punctuation_marks of the mark following each word
+    punctuation_ids: torch.Tensor
+    capitalized: torch.Tensor
+    confidences: Optional[torch.Tensor]
+    punctuation_marks: List[str]
+
+    def to_text(self) -> str:
+        """
+        Combines words, capitalization and punctuation into the same string as PunctFixer.punctuate.
+
+        :return: A punctuated text
+        """
+        return " ".join(
+            (word.capitalize() if capitalized else word) + self.punctuation_marks[punctuation_id]
+            for word, capitalized, punctuation_id in zip(self.words, self.capitalized.tolist(),
+                                                         self.punctuation_ids.tolist())
+        )
+
+
+class PunctFixer:  # pylint: disable=too-many-instance-attributes,too-many-public-methods
     """
     PunctFixer used to punctuate a given text.
     """
 
-    def __init__(self, language: str = "da",
+    def __init__(self, language: str = "da",  # pylint: disable=too-many-arguments,too-many-locals
                  custom_model_path: str = None,
                  use_auth_token: Optional[Union[bool, str]] = None,
                  word_overlap: int = 70,
@@ -55,7 +118,13 @@ class PunctFixer:
                  device: Union[str, torch.device] = torch.device("cpu"),
                  skip_normalization=False,
                  warn_on_normalization=False,
-                 batch_size: int = 1
+                 batch_size: int = 1,
+                 adaptive_confidence_threshold: Optional[float] = None,
+                 adaptive_edge_margin: int = 10,
+                 max_tokens_per_batch: Optional[int] = None,
+                 max_packed_tokens: Optional[int] = None,
+                 merge_concurrent_calls: bool = False,
+                 short_input_words: int = 0
                  ):
         """
         :param language: Valid options are "da", "de", "en", for Danish, German and English, respectively.
@@ -66,6 +135,23 @@ class PunctFixer:
         :param skip_normalization: Don't check input text and don't normalize it.
         :param warn_on_normalization: Warn the user if the input text was normalized.
         :param batch_size: Number of text chunks to pass through token classification pipeline.
+        :param adaptive_confidence_threshold: If set, long texts are first chunked without overlap and only
+            words with a score below this threshold, or near chunk edges, are re-run in shifted windows.
+            Defaults to None, which uses the regular overlapping chunks.
+        :param adaptive_edge_margin: How many words on each side of a chunk edge are re-run when using
+            adaptive overlap. Defaults to 10.
+        :param max_tokens_per_batch: If set, text chunks are sorted by token length and batched such that
+            a batch, padded to its longest chunk, holds at most this many tokens. Overrides batch_size.
+        :param max_packed_tokens: If set, several short text chunks are packed into each model input of at most this
+            many tokens, e.g. 512. An attention mask keeps the chunks from attending to each other, so predictions
+            are the same as without packing. Requires a BERT style model. Each model input counts towards batch_size.
+            As each chunk keeps its own position ids, this can be larger than the max length of the model.
+        :param merge_concurrent_calls: If True, chunks from threads calling the fixer at the same time are merged and
+            predicted together in a background thread. Defaults to False, where each thread runs its own prediction.
+        :param short_input_words: Chunks with fewer words than this skip the pipeline and are tokenized, predicted
+            and aligned directly, which has much less overhead per call. They are still batched by batch_size,
+            max_tokens_per_batch or packing. Defaults to 0, which disables this. Empty inputs never run the model.
+            Tokenizes words split in advance, so GPT-2 or RoBERTa style tokenizers need add_prefix_space=True.
         """
 
         self.word_overlap = word_overlap
@@ -73,6 +159,12 @@ class PunctFixer:
         self.skip_normalization = skip_normalization
         self.warn_on_normalization = warn_on_normalization
         self.batch_size = batch_size
+        self.adaptive_confidence_threshold = adaptive_confidence_threshold
+        self.adaptive_edge_margin = adaptive_edge_margin
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.max_packed_tokens = max_packed_tokens
+        self.merge_concurrent_calls = merge_concurrent_calls
+        self.short_input_words = short_input_words
 
         self.supported_languages = {
             "de": "German",
@@ -100,11 +192,64 @@ class PunctFixer:
             self.device = device
 
 
-        self.pipe = TokenClassificationPipeline(model=self.model,
-                                                tokenizer=self.tokenizer,
-                                                aggregation_strategy="first",
-                                                device=self.device,
-                                                ignore_labels=[])
+        self.pipe = WordTokenClassificationPipeline(model=self.model,
+                                                    tokenizer=self.tokenizer,
+                                                    aggregation_strategy="first",
+                                                    device=self.device,
+                                                    ignore_labels=[])
+
+        self._init_thread_state()
+
+    def _init_thread_state(self):
+        """
+        Sets up the per thread tokenizers and pipelines and the state of the merge worker.
+        """
+        # Fast tokenizers and pipelines are not safe to share between threads, so other threads get their own copies
+        self._owner_thread_id = threading.get_ident()
+        self._thread_local = threading.local()
+        self._merge_lock = threading.Lock()
+        self._merge_requests = []
+        self._merge_worker_running = False
+        self._merge_handles = None
+
+    def __getstate__(self) -> dict:
+        # Thread state can not be copied, and copies get their own
+        state = self.__dict__.copy()
+        for name in ("_owner_thread_id", "_thread_local", "_merge_lock", "_merge_requests",
+                     "_merge_worker_running", "_merge_handles"):
+            del state[name]
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._init_thread_state()
+
+    def _create_handles(self) -> Tuple[PreTrainedTokenizerFast, TokenClassificationPipeline]:
+        """
+        Creates a copy of the tokenizer and a pipeline using it, sharing the model.
+
+        :return: Tuple with (tokenizer, pipeline)
+        """
+        tokenizer = copy.deepcopy(self.tokenizer)
+        pipe = WordTokenClassificationPipeline(model=self.model,
+                                               tokenizer=tokenizer,
+                                               aggregation_strategy="first",
+                                               device=self.device,
+                                               ignore_labels=[])
+        return tokenizer, pipe
+
+    def _thread_handles(self) -> Tuple[PreTrainedTokenizerFast, TokenClassificationPipeline]:
+        """
+        Gets the tokenizer and pipeline of the calling thread. The thread that created the fixer uses the tokenizer
+        and pipe attributes, other threads get copies on first use.
+
+        :return: Tuple with (tokenizer, pipeline)
+        """
+        if threading.get_ident() == self._owner_thread_id:
+            return self.tokenizer, self.pipe
+        if not hasattr(self._thread_local, "pipe"):
+            self._thread_local.tokenizer, self._thread_local.pipe = self._create_handles()
+        return self._thread_local.tokenizer, self._thread_local.pipe
 
     def get_supported_languages(self) -> Dict[str, str]:
         """
@@ -124,15 +269,21 @@ class PunctFixer:
         """
         return [WordPrediction(word=word, labels=[]) for word in words]
 
-    def populate_word_prediction_with_labels(self, chunks: List[List[str]], word_prediction_list: List[WordPrediction]):
+    def populate_word_prediction_with_labels(self, chunks: List[List[str]], word_prediction_list: List[WordPrediction],
+                                             chunk_starts: Optional[List[int]] = None):
         """
         Performs predictions on all chunks of text, and adds labels to the relevant word predictions.
 
         :param chunks: List of List of words
         :param word_prediction_list: A list containing word predictions i.e. word and labels.
+        :param chunk_starts: Index in word_prediction_list of the first word of each chunk.
+            Defaults to the positions given by word_chunk_size and word_overlap.
         :return: Word predictions list with all label predictions for each word
         """
-        outputs = self.pipe([" ".join(chunk_text) for chunk_text in chunks], batch_size=self.batch_size)
+        if chunk_starts is None:
+            chunk_starts = [i * (self.word_chunk_size - self.word_overlap) for i in range(len(chunks))]
+
+        outputs = self._run_merged(chunks) if self.merge_concurrent_calls else self._run_pipeline(chunks)
         for i, output in enumerate(outputs):
             word_counter = 0
             for entity in output:
@@ -141,27 +292,405 @@ class PunctFixer:
                 words_in_text = text.split(" ")
 
                 for word in words_in_text:
-                    current_index = i * self.word_chunk_size + word_counter - (i * self.word_overlap)
+                    current_index = chunk_starts[i] + word_counter
 
                     # Sanity check
                     assert word_prediction_list[current_index].word == word, \
                         f"Something went wrong while matching word list ... " \
                         f"Tried matching the word: {word} with {word_prediction_list[current_index].word}"
                     word_prediction_list[current_index].labels.append(label)
+                    if "score" in entity:
+                        word_prediction_list[current_index].scores.append(float(entity["score"]))
                     word_counter += 1
 
         return word_prediction_list
 
-    def combine_word_predictions_into_final_text(self, word_prediction_list: List[WordPrediction]):
+    def _run_pipeline(self, chunks: List[List[str]]) -> List[List[dict]]:
+        """
+        Runs the token classification pipeline on all chunks. Empty chunks get no predictions without running
+        the model, and chunks shorter than short_input_words are predicted directly without the pipeline.
+
+        :param chunks: List of List of words
+        :return: List of pipeline outputs in the same order as the chunks
+        """
+        short = [i for i, chunk_text in enumerate(chunks) if len(chunk_text) < max(self.short_input_words, 1)]
+        if not short:
+            return self._run_batched(chunks)
+
+        outputs = [[] for _ in chunks]
+        rest = [i for i, chunk_text in enumerate(chunks) if len(chunk_text) >= max(self.short_input_words, 1)]
+        for group, direct in (([i for i in short if chunks[i]], True), (rest, False)):
+            if group:
+                for i, output in zip(group, self._run_batched([chunks[i] for i in group], direct=direct)):
+                    outputs[i] = output
+        return outputs
+
+    def _run_batched(self, chunks: List[List[str]], direct: bool = False) -> List[List[dict]]:
+        """
+        Runs the token classification pipeline on all chunks, either in batches of batch_size
+        or, if max_tokens_per_batch is set, in length sorted batches. If max_packed_tokens is set,
+        chunks are packed together instead.
+
+        :param chunks: List of List of words
+        :param direct: If True, the batches are tokenized, predicted and aligned directly instead of through the
+            pipeline, which has less overhead per call.
+        :return: List of pipeline outputs in the same order as the chunks
+        """
+        if self.max_packed_tokens is not None:
+            return self._run_packed(chunks)
+
+        texts = [" ".join(chunk_text) for chunk_text in chunks]
+        if self.max_tokens_per_batch is None:
+            batches = [list(range(i, min(i + self.batch_size, len(texts))))
+                       for i in range(0, len(texts), self.batch_size)]
+        else:
+            batches = self.schedule_batches(texts)
+
+        if direct:
+            return self._run_direct(chunks, batches)
+
+        _, pipe = self._thread_handles()
+        with torch.inference_mode():
+            if self.max_tokens_per_batch is None:
+                return pipe(texts, batch_size=self.batch_size)
+
+            outputs = [None] * len(texts)
+            for batch in batches:
+                batch_outputs = pipe([texts[i] for i in batch], batch_size=len(batch))
+                for i, output in zip(batch, batch_outputs):
+                    outputs[i] = output
+            return outputs
+
+    def _run_direct(self, chunks: List[List[str]], batches: List[List[int]]) -> List[List[dict]]:
+        """
+        Tokenizes, predicts and aligns labels of one batch after another in this thread.
+
+        :param chunks: List of List of words
+        :param batches: List of batches, each a list of indices into chunks
+        :return: List of outputs in the same format as the pipeline, in the same order as the chunks
+        """
+        outputs = [None] * len(chunks)
+        for batch in batches:
+            batch_chunks = [chunks[i] for i in batch]
+            encoding = self.tokenize_chunks(batch_chunks)
+            for i, output in zip(batch, self.align_labels(batch_chunks, encoding, self.forward_chunks(encoding))):
+                outputs[i] = output
+        return outputs
+
+    def _run_merged(self, chunks: List[List[str]]) -> List[List[dict]]:
+        """
+        Hands the chunks to the merge worker, which predicts them together with chunks from other threads,
+        and waits for the result.
+
+        :param chunks: List of List of words
+        :return: List of pipeline outputs in the same order as the chunks
+        """
+        future = Future()
+        with self._merge_lock:
+            self._merge_requests.append((chunks, future))
+            if not self._merge_worker_running:
+                self._merge_worker_running = True
+                threading.Thread(target=self._merge_worker, daemon=True).start()
+        return future.result()
+
+    def _merge_worker(self):
+        """
+        Predicts all waiting chunks in one run of the pipeline until no more chunks are waiting.
+        At most one merge worker runs at a time, so they share one tokenizer and pipeline.
+        """
+        if self._merge_handles is None:
+            self._merge_handles = self._create_handles()
+        self._thread_local.tokenizer, self._thread_local.pipe = self._merge_handles
+
+        while True:
+            with self._merge_lock:
+                requests, self._merge_requests = self._merge_requests, []
+                if not requests:
+                    self._merge_worker_running = False
+                    return
+
+            try:
+                outputs = self._run_pipeline([chunk_text for chunks, _ in requests for chunk_text in chunks])
+            except Exception as ex:  # pylint: disable=broad-except
+                if len(requests) == 1:
+                    requests[0][1].set_exception(ex)
+                    continue
+                # The error might be caused by a single request, so each request is retried on its own
+                # such that only the failing requests get an error
+                for chunks, future in requests:
+                    try:
+                        future.set_result(self._run_pipeline(chunks))
+                    except Exception as request_ex:  # pylint: disable=broad-except
+                        future.set_exception(request_ex)
+                continue
+
+            start = 0
+            for chunks, future in requests:
+                future.set_result(outputs[start:start + len(chunks)])
+                start += len(chunks)
+
+    def _run_packed(self, chunks: List[List[str]]) -> List[List[dict]]:
+        """
+        Packs the chunks into model inputs of at most max_packed_tokens tokens and predicts on batch_size of
+        these at a time.
+
+        :param chunks: List of List of words
+        :return: List of outputs in the same format as the pipeline, in the same order as the chunks
+        """
+        outputs = [[] for _ in chunks]
+        # Empty chunks get no predictions, so they are left out
+        non_empty = [i for i, chunk_text in enumerate(chunks) if chunk_text]
+        if not non_empty:
+            return outputs
+
+        encoding = self._thread_handles()[0]([chunks[i] for i in non_empty], is_split_into_words=True, truncation=True)
+        rows = self.pack_rows([len(input_ids) for input_ids in encoding["input_ids"]])
+        for batch_start in range(0, len(rows), self.batch_size):
+            batch_rows = rows[batch_start:batch_start + self.batch_size]
+            scores, label_ids = self.forward_packed_rows(encoding["input_ids"], batch_rows).max(-1)
+            scores, label_ids = scores.tolist(), label_ids.tolist()
+            for row_idx, row in enumerate(batch_rows):
+                offset = 0
+                for i in row:
+                    word_ids = encoding.word_ids(i)
+                    outputs[non_empty[i]] = self._first_token_entities(
+                        chunks[non_empty[i]], word_ids,
+                        scores[row_idx][offset:offset + len(word_ids)],
+                        label_ids[row_idx][offset:offset + len(word_ids)]
+                    )
+                    offset += len(word_ids)
+        return outputs
+
+    def pack_rows(self, lengths: List[int]) -> List[List[int]]:
+        """
+        Packs sequences into rows of at most max_packed_tokens tokens using first fit decreasing.
+        A sequence longer than max_packed_tokens gets a row of its own.
+
+        :param lengths: Token length of each sequence
+        :return: List of rows, each a list of indices into lengths in the order they are packed
+        """
+        rows = []
+        row_lengths = []
+        for i in sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True):
+            for row_idx, row_length in enumerate(row_lengths):
+                if row_length + lengths[i] <= self.max_packed_tokens:
+                    rows[row_idx].append(i)
+                    row_lengths[row_idx] += lengths[i]
+                    break
+            else:
+                rows.append([i])
+                row_lengths.append(lengths[i])
+        return rows
+
+    def forward_packed_rows(self, input_ids: List[List[int]], rows: List[List[int]]) -> torch.Tensor:
+        """
+        Runs the model on rows of packed sequences. Each sequence keeps its own special tokens and position ids,
+        and attends only to itself through a block diagonal attention mask.
+
+        :param input_ids: Token ids of each sequence
+        :param rows: List of rows, each a list of indices into input_ids
+        :return: Label probabilities for each token as a tensor of shape (rows, tokens, labels)
+        """
+        max_length = max(sum(len(input_ids[i]) for i in row) for row in rows)
+        packed_input_ids = torch.full((len(rows), max_length), self.tokenizer.pad_token_id, dtype=torch.long)
+        position_ids = torch.zeros((len(rows), max_length), dtype=torch.long)
+        attention_mask = torch.zeros((len(rows), max_length, max_length), dtype=torch.long)
+        for row_idx, row in enumerate(rows):
+            offset = 0
+            for i in row:
+                end = offset + len(input_ids[i])
+                packed_input_ids[row_idx, offset:end] = torch.tensor(input_ids[i])
+                position_ids[row_idx, offset:end] = torch.arange(len(input_ids[i]))
+                attention_mask[row_idx, offset:end, offset:end] = 1
+                offset = end
+
+        with torch.inference_mode():
+            # Token type ids are passed explicitly, as the buffered defaults of the model only cover its max length
+            logits = self.model(input_ids=packed_input_ids.to(self.model.device),
+                                attention_mask=attention_mask.to(self.model.device),
+                                position_ids=position_ids.to(self.model.device),
+                                token_type_ids=torch.zeros_like(packed_input_ids).to(self.model.device)).logits
+            return logits.softmax(-1).cpu()
+
+    def tokenize_chunks(self, chunks: List[List[str]]):
+        """
+        Tokenizes a batch of chunks, keeping track of which word each token belongs to. As the words are split
+        in advance, GPT-2 or RoBERTa style tokenizers must be created with add_prefix_space=True.
+
+        :param chunks: List of List of words
+        :return: A padded BatchEncoding of torch tensors
+        """
+        tokenizer, _ = self._thread_handles()
+        return tokenizer(chunks, is_split_into_words=True, padding=True, truncation=True, return_tensors="pt")
+
+    def forward_chunks(self, encoding) -> torch.Tensor:
+        """
+        Runs the model on a tokenized batch.
+
+        :param encoding: A BatchEncoding as returned by tokenize_chunks
+        :return: Label probabilities for each token as a tensor of shape (batch, tokens, labels)
+        """
+        with torch.inference_mode():
+            logits = self.model(**{key: value.to(self.model.device) for key, value in encoding.items()}).logits
+            return logits.softmax(-1).cpu()
+
+    def align_labels(self, chunks: List[List[str]], encoding, probabilities: torch.Tensor) -> List[List[dict]]:
+        """
+        Gives each word the label predicted for its first token, matching the "first" aggregation strategy.
+
+        :param chunks: List of List of words
+        :param encoding: A BatchEncoding as returned by tokenize_chunks
+        :param probabilities: Label probabilities as returned by forward_chunks
+        :return: List of outputs in the same format as the pipeline with one entity per word
+        """
+        scores, label_ids = probabilities.max(-1)
+        scores, label_ids = scores.tolist(), label_ids.tolist()
+        return [self._first_token_entities(chunk_text, encoding.word_ids(row), scores[row], label_ids[row])
+                for row, chunk_text in enumerate(chunks)]
+
+    def _first_token_entities(self, words: List[str], word_ids: List[Optional[int]], scores: List[float],
+                              label_ids: List[int]) -> List[dict]:
+        """
+        Creates one pipeline style entity per word from the prediction for the first token of the word.
+
+        :param words: List of words in the chunk
+        :param word_ids: Index of the word each token belongs to, None for special tokens
+        :param scores: Score of the predicted label for each token
+        :param label_ids: Predicted label id for each token
+        :return: List of entities
+        """
+        entities = []
+        previous_word_id = None
+        for word_id, score, label_id in zip(word_ids, scores, label_ids):
+            if word_id is None or word_id == previous_word_id:
+                continue
+            previous_word_id = word_id
+            entities.append({"entity_group": self.model.config.id2label[label_id],
+                             "score": score,
+                             "word": words[word_id]})
+        return entities
+
+    def get_token_lengths(self, texts: List[str]) -> List[int]:
+        """
+        Gets the number of tokens the model will see for each text, including special tokens.
+
+        :param texts: List of texts
+        :return: List of token lengths
+        """
+        tokenizer, _ = self._thread_handles()
+        return [len(input_ids) for input_ids in tokenizer(texts)["input_ids"]]
+
+    def schedule_batches(self, texts: List[str]) -> List[List[int]]:
+        """
+        Sorts texts by token length and groups them in batches such that the number of tokens in a batch,
+        when padded to its longest text, does not exceed max_tokens_per_batch. A text longer than the budget
+        gets a batch of its own.
+
+        :param texts: List of texts
+        :return: List of batches, each a list of indices into texts
+        """
+        lengths = self.get_token_lengths(texts)
+        batches = []
+        batch = []
+        # Texts are visited from shortest to longest, so the current text is the longest in its batch
+        for i in sorted(range(len(texts)), key=lambda i: lengths[i]):
+            if batch and (len(batch) + 1) * lengths[i] > self.max_tokens_per_batch:
+                batches.append(batch)
+                batch = []
+            batch.append(i)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    @staticmethod
+    def padding_efficiency(lengths: List[int], batches: List[List[int]]) -> float:
+        """
+        Fraction of the tokens passed through the model that are not padding.
+
+        :param lengths: Token length of each text
+        :param batches: List of batches, each a list of indices into lengths
+        :return: Efficiency between 0 and 1
+        """
+        padded_tokens = sum(len(batch) * max(lengths[i] for i in batch) for batch in batches)
+        return sum(lengths[i] for batch in batches for i in batch) / padded_tokens if padded_tokens else 1.0
+
+    def populate_word_prediction_adaptively(self, words: List[str], word_prediction_list: List[WordPrediction]):
+        """
+        Adaptive alternative to overlapping chunks. The text is first predicted in chunks without overlap.
+        Words near the chunk edges or with a confidence below adaptive_confidence_threshold are then
+        re-predicted in windows shifted to give them more context. A last round of shifted windows is
+        run for words whose labels are tied after this.
+
+        :param words: List of words
+        :param word_prediction_list: A list containing word predictions i.e. word and labels.
+        :return: Word predictions list with all label predictions for each word
+        """
+        chunk_starts = list(range(0, max(len(words), 1), self.word_chunk_size))
+        self.populate_word_prediction_with_labels(
+            [words[start:start + self.word_chunk_size] for start in chunk_starts],
+            word_prediction_list,
+            chunk_starts
+        )
+        if len(words) <= self.word_chunk_size:
+            return word_prediction_list
+
+        edge_indices = set()
+        for edge in chunk_starts[1:]:
+            edge_indices.update(range(edge - self.adaptive_edge_margin, edge + self.adaptive_edge_margin))
+        flagged = [i for i, word_pred in enumerate(word_prediction_list)
+                   if i in edge_indices or word_pred.confidence < self.adaptive_confidence_threshold]
+
+        # The tie breaking round gives the flagged words more context than the first round
+        used_windows = {(start, start + self.word_chunk_size) for start in chunk_starts}
+        for context in (self.word_chunk_size // 4, (self.word_chunk_size - 1) // 2):
+            windows = [window for window in self._place_windows(flagged, len(words), context)
+                       if window not in used_windows]
+            if not windows:
+                break
+            # Only flagged words keep the labels from the shifted windows, the rest are left as they were
+            flagged_set = set(flagged)
+            self.populate_word_prediction_with_labels(
+                [words[start:end] for start, end in windows],
+                [word_pred if i in flagged_set else WordPrediction(word=word_pred.word, labels=[])
+                 for i, word_pred in enumerate(word_prediction_list)],
+                [start for start, _ in windows]
+            )
+            used_windows.update(windows)
+            flagged = [i for i in flagged if word_prediction_list[i].is_conflicting]
+
+        return word_prediction_list
+
+    def _place_windows(self, flagged: List[int], num_words: int, context: int) -> List[Tuple[int, int]]:
+        """
+        Greedily places windows of at most word_chunk_size words such that every flagged word is covered,
+        preferably with context words on each side.
+
+        :param flagged: Sorted list of word indices that must be covered
+        :param num_words: Total number of words in the text
+        :param context: Number of words to include on each side of a flagged word
+        :return: List of (start, end) word indices of the windows
+        """
+        windows = []
+        for idx in flagged:
+            end = min(idx + context + 1, num_words)
+            if windows and end - windows[-1][0] <= self.word_chunk_size:
+                windows[-1] = (windows[-1][0], max(windows[-1][1], end))
+            elif not windows or idx >= windows[-1][1]:
+                windows.append((max(idx - context, 0), end))
+        return windows
+
+    def combine_word_predictions_into_final_text(self, word_prediction_list: List[WordPrediction],
+                                                 auto_uppercase: bool = False):
         """
         Combines all predictions for each word into a final string by checking label (majority vote or if equal
         predictions, it chooses however Counter from itertools chooses top_n.
 
         :param word_prediction_list: List of word predictions
+        :param auto_uppercase: Whether to capitalize the first word, e.g. if it continues after a sentence end
         :return: A final string with punctuation
         """
         final_text = []
-        auto_upper_next = False
+        auto_upper_next = auto_uppercase
         for word_pred in word_prediction_list:
             punctuated_text, auto_upper_next = self._combine_label_and_word(word_pred.label,
                                                                             word_pred.word,
@@ -190,6 +719,22 @@ class PunctFixer:
         :return: A punctuated text.
         """
         words = self.split_input_text(text)
+        word_prediction_list = self.predict_words(words)
+        return self.combine_word_predictions_into_final_text(word_prediction_list)
+
+    def predict_words(self, words: List[str]) -> List[WordPrediction]:
+        """
+        Predicts labels for a list of normalized words.
+
+        :param words: List of words
+        :return: Word predictions list with all label predictions for each word
+        """
+        word_prediction_list = self.init_word_prediction_list(words)
+        if not words:
+            return word_prediction_list
+
+        if self.adaptive_confidence_threshold is not None:
+            return self.populate_word_prediction_adaptively(words, word_prediction_list)
 
         # If we have a long sequence of text (measured by words), we split it into chunks
         chunks = []
@@ -198,10 +743,89 @@ class PunctFixer:
         else:
             chunks.append(words)
 
-        # We create a word prediction list and then combine the predictions to to final text
-        word_prediction_list = self.init_word_prediction_list(words)
-        word_prediction_list = self.populate_word_prediction_with_labels(chunks, word_prediction_list)
-        return self.combine_word_predictions_into_final_text(word_prediction_list)
+        # We populate the word prediction list which can then be combined to final text
+        return self.populate_word_prediction_with_labels(chunks, word_prediction_list)
+
+    def punctuate_structured(self, text: Union[str, List[str]],
+                             return_confidence: bool = False) -> "StructuredPunctuation":
+        """
+        Punctuates given text, returning arrays with the punctuation and capitalization of each word
+        instead of a string.
+
+        :param text: A lowercase text with no punctuation, or a list of such words.
+            Words are normalized in the same way as by split_input_text.
+        :param return_confidence: Whether to include the confidence of each prediction, i.e. the mean model
+            score of the overlapping chunks agreeing with the predicted label.
+        :return: A StructuredPunctuation with one entry per normalized word.
+        """
+        words, word_indices = self.normalize_words(text.split(" ") if isinstance(text, str) else text)
+        word_prediction_list = self.predict_words(words)
+
+        punctuation_ids = {mark: i for i, mark in enumerate(self.punctuation_marks)}
+        punctuation = []
+        capitalized = []
+        auto_upper_next = False
+        for word_pred in word_prediction_list:
+            label = word_pred.label
+            punctuation.append(punctuation_ids["" if label[0] == "O" else label[0]])
+            capitalized.append(label[-1] == "U" or auto_upper_next)
+            auto_upper_next = label[0] in {".", "!", "?"}
+
+        return StructuredPunctuation(
+            words=words,
+            word_indices=torch.tensor(word_indices, dtype=torch.long),
+            punctuation_ids=torch.tensor(punctuation, dtype=torch.long),
+            capitalized=torch.tensor(capitalized, dtype=torch.bool),
+            confidences=torch.tensor([word_pred.confidence for word_pred in word_prediction_list])
+            if return_confidence else None,
+            punctuation_marks=self.punctuation_marks
+        )
+
+    @property
+    def punctuation_marks(self) -> List[str]:
+        """
+        The punctuation marks the model can predict. The index of a mark is its id in punctuate_structured
+        and the empty string, id 0, means no punctuation.
+
+        :return: List of punctuation marks
+        """
+        return [""] + sorted({label[0] for label in self.model.config.id2label.values()} - {"O"})
+
+    def punctuate_batch(self, texts: List[str]) -> List[str]:
+        """
+        Punctuates several texts, predicting on the chunks of all texts together. This allows batching and packing
+        of chunks across texts.
+
+        :param texts: List of lowercase texts with no punctuation.
+        :return: List of punctuated texts.
+        """
+        if self.adaptive_confidence_threshold is not None:
+            return [self.punctuate(text) for text in texts]
+
+        documents = [self.split_input_text(text) for text in texts]
+
+        # All words go in one word prediction list with chunk starts pointing into it
+        chunks = []
+        chunk_starts = []
+        document_start = 0
+        for words in documents:
+            document_chunks = self.split_words_into_chunks(words) if len(words) >= self.word_chunk_size else [words]
+            chunks.extend(document_chunks)
+            chunk_starts.extend(document_start + i * (self.word_chunk_size - self.word_overlap)
+                                for i in range(len(document_chunks)))
+            document_start += len(words)
+
+        word_prediction_list = self.init_word_prediction_list([word for words in documents for word in words])
+        word_prediction_list = self.populate_word_prediction_with_labels(chunks, word_prediction_list, chunk_starts)
+
+        punctuated_texts = []
+        document_start = 0
+        for words in documents:
+            punctuated_texts.append(self.combine_word_predictions_into_final_text(
+                word_prediction_list[document_start:document_start + len(words)]
+            ))
+            document_start += len(words)
+        return punctuated_texts
 
     def split_input_text(self, text: str) -> List[str]:
         """
@@ -209,13 +833,21 @@ class PunctFixer:
         :param text: A lowercase text with no punctuation (otherwise normalized)
         :return: A list of the words in that text, splitted and normalized.
         """
-        words = text.split(" ")
+        return self.normalize_words(text.split(" "))[0]
+
+    def normalize_words(self, words: List[str]) -> Tuple[List[str], List[int]]:
+        """
+        Normalizes a list of words, removing words that are empty after normalization.
+        :param words: A list of lowercase words with no punctuation (otherwise normalized)
+        :return: Tuple with the normalized words and the index in words of each normalized word
+        """
         if self.skip_normalization:
-            return words
+            return list(words), list(range(len(words)))
 
         normalized_words = []
+        word_indices = []
         to_warn = []
-        for word in words:
+        for i, word in enumerate(words):
             if not word:
                 to_warn.append("Additional whitespace was removed.")
             norm_word = WORD_NORMALIZATION_PATTERN.sub("", word)
@@ -230,6 +862,7 @@ class PunctFixer:
                 norm_word = norm_word.lower()
                 to_warn.append("Text was lowercased.")
             normalized_words.append(norm_word)
+            word_indices.append(i)
 
         # Warn once for each type of normalization
         if self.warn_on_normalization and to_warn:
@@ -239,7 +872,7 @@ class PunctFixer:
                 " To avoid seeing this, set suppress_normalization_warning=True. "\
                 "To entirely circumvent normalization, set skip_normalization=True. ",
                 NonNormalizedTextWarning)
-        return normalized_words
+        return normalized_words, word_indices
 
     @staticmethod
     def _combine_label_and_word(label: str, word: str, auto_uppercase: bool = False) -> Tuple[str, bool]:
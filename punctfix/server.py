@@ -0,0 +1,220 @@
+import argparse
+import asyncio
+import ipaddress
+import json
+import socket
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from punctfix.inference import PunctFixer
+from punctfix.streaming import PunctFixStreamer
+
+# Each message is a JSON object prefixed by its length in bytes as a 4 byte big endian unsigned integer
+HEADER = struct.Struct(">I")
+MAX_MESSAGE_BYTES = 1 << 20
+
+
+class MessageTooLarge(Exception):
+    """
+    Exception raised if a message is larger than MAX_MESSAGE_BYTES.
+    """
+
+
+async def read_message(reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+    """
+    Reads one length prefixed JSON message.
+
+    :param reader: Stream to read from
+    :return: The message, or None if the stream was closed, also in the middle of a message
+    """
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    (length,) = HEADER.unpack(header)
+    if length > MAX_MESSAGE_BYTES:
+        raise MessageTooLarge(f"Message of {length} bytes is larger than the maximum of {MAX_MESSAGE_BYTES} bytes.")
+    try:
+        data = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return None
+    message = json.loads(data.decode("utf-8"))
+    if not isinstance(message, dict):
+        raise ValueError("Messages must be JSON objects.")
+    return message
+
+
+async def write_message(writer: asyncio.StreamWriter, message: Dict[str, Any]):
+    """
+    Writes one length prefixed JSON message, waiting until the stream accepts more data.
+
+    :param writer: Stream to write to
+    :param message: The message
+    """
+    data = json.dumps(message).encode("utf-8")
+    writer.write(HEADER.pack(len(data)) + data)
+    await writer.drain()
+
+
+class PunctFixServer:
+    """
+    A local TCP server punctuating many concurrent text streams, each with its own PunctFixStreamer.
+
+    Clients send {"text": "..."} messages with new text segments and finally {"finalize": true}.
+    The server answers with {"delta": "...", "final": false} whenever more of the punctuated text is finalized,
+    where delta is the text to append to the previously sent deltas, and with {"delta": "...", "final": true}
+    when the stream is finalized. On errors, {"error": "..."} is sent and the connection is closed.
+
+    Model work from all connections is merged into shared batches. If the model falls behind, at most
+    max_pending_segments segments are queued per connection before the server stops reading from it.
+    """
+
+    def __init__(self, punct_fixer: PunctFixer, host: str = "127.0.0.1", port: int = 8765,
+                 max_pending_segments: int = 16, max_workers: int = 32):
+        """
+        :param punct_fixer: An instantiated punct fixer. Note that merge_concurrent_calls is set to True on it,
+            also for other code sharing it, until the server is closed and the previous value is restored.
+        :param host: Host to listen on. Must be a loopback address.
+        :param port: Port to listen on. If 0, a free port is chosen and saved in port when started.
+        :param max_pending_segments: How many received segments can wait for the model per connection.
+        :param max_workers: How many connections can wait for the model at the same time.
+        """
+        addresses = [address[4][0] for address in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+        # The server listens on all addresses of the host, so all of them must be loopback addresses
+        if not all(ipaddress.ip_address(address.split("%")[0]).is_loopback for address in addresses):
+            raise ValueError(f"The server only runs on localhost, but host {host} is not a loopback address.")
+        self.punct_fixer = punct_fixer
+        self._previous_merge_concurrent_calls = punct_fixer.merge_concurrent_calls
+        self.punct_fixer.merge_concurrent_calls = True
+        self.host = host
+        self.port = port
+        self.max_pending_segments = max_pending_segments
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        """
+        Starts listening for connections.
+        """
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        """
+        Starts the server if needed and serves until cancelled.
+        """
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        """
+        Stops listening for connections, waits for the server to close and restores merge_concurrent_calls
+        of the punct fixer.
+        """
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        self.executor.shutdown(wait=False)
+        self.punct_fixer.merge_concurrent_calls = self._previous_merge_concurrent_calls
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Reads messages from a connection into a bounded queue, which is processed concurrently.
+        """
+        segments = asyncio.Queue(maxsize=self.max_pending_segments)
+        processor = asyncio.ensure_future(self._process_segments(segments, writer))
+        try:
+            while not processor.done():
+                message = await read_message(reader)
+                # Waits when the queue is full, such that the client is slowed down by TCP flow control
+                put = asyncio.ensure_future(segments.put(message))
+                await asyncio.wait([put, processor], return_when=asyncio.FIRST_COMPLETED)
+                if not put.done():
+                    put.cancel()
+                    break
+                if message is None or message.get("finalize"):
+                    break
+            await processor
+        except (MessageTooLarge, ValueError) as ex:
+            processor.cancel()
+            await self._send_error(writer, ex)
+        except ConnectionError:
+            pass
+        finally:
+            # The processor must not outlive the connection, whatever ended it
+            if not processor.done():
+                processor.cancel()
+            writer.close()
+
+    async def _process_segments(self, segments: asyncio.Queue, writer: asyncio.StreamWriter):
+        """
+        Streams queued segments through a PunctFixStreamer and sends finalized text back.
+        """
+        loop = asyncio.get_running_loop()
+        streamer = PunctFixStreamer(self.punct_fixer)
+        sent = ""
+        try:
+            while True:
+                messages = [await segments.get()]
+                # All queued text is streamed in at once, which gives the same result as one segment at a time
+                while not segments.empty() and messages[-1] is not None and not messages[-1].get("finalize"):
+                    messages.append(segments.get_nowait())
+                texts = [message["text"] for message in messages if message is not None and "text" in message]
+
+                if texts:
+                    result = await loop.run_in_executor(self.executor, streamer, " ".join(texts))
+                    if result is not None and len(result) > len(sent):
+                        await write_message(writer, {"delta": result[len(sent):], "final": False})
+                        sent = result
+
+                if messages[-1] is None:
+                    return
+                if messages[-1].get("finalize"):
+                    result = await loop.run_in_executor(self.executor, streamer.finalize)
+                    await write_message(writer, {"delta": result[len(sent):], "final": True})
+                    return
+        except ConnectionError:
+            return
+        except Exception as ex:  # pylint: disable=broad-except
+            await self._send_error(writer, ex)
+            writer.close()
+
+    @staticmethod
+    async def _send_error(writer: asyncio.StreamWriter, error: Exception):
+        """
+        Tries to tell the client about an error.
+        """
+        try:
+            await write_message(writer, {"error": str(error)})
+        except ConnectionError:
+            pass
+
+
+def main():
+    """
+    Runs a PunctFixServer from the command line.
+    """
+    parser = argparse.ArgumentParser(description="Local streaming punctuation server.")
+    parser.add_argument("--language", default="da", help="Language of the model, da, de or en.")
+    parser.add_argument("--custom-model-path", default=None, help="Path to a custom model.")
+    parser.add_argument("--host", default="127.0.0.1", help="Loopback address to listen on.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-pending-segments", type=int, default=16)
+    args = parser.parse_args()
+
+    punct_fixer = PunctFixer(language=args.language, custom_model_path=args.custom_model_path,
+                             device=args.device, batch_size=args.batch_size)
+    server = PunctFixServer(punct_fixer, host=args.host, port=args.port,
+                            max_pending_segments=args.max_pending_segments)
+    print(f"Serving on {args.host}:{args.port}")
+    asyncio.run(server.serve_forever())
+
+
+if __name__ == "__main__":
+    main()
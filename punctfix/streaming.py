@@ -1,8 +1,14 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 from punctfix.inference import PunctFixer, WordPrediction
 
 
+class IncompatibleStreamerState(Exception):
+    """
+    Exception raised if a streamer state is restored with a punct fixer using another chunk size or overlap.
+    """
+
+
 class PunctFixStreamer:
     """
     A stateful streamer that receives text in segments, on-line performing punct-fixing and
@@ -12,6 +18,9 @@ class PunctFixStreamer:
 
     chunked_words: List[WordPrediction]
     buffer: List[WordPrediction]
+    # Number of words that were finalized and dropped before chunked_words when restoring a saved state
+    word_offset: int
+    auto_uppercase: bool
 
     def __init__(self, punct_fixer: PunctFixer):
         """
@@ -25,11 +34,11 @@ class PunctFixStreamer:
         Stream in new text, returning None if this new text did not change anything
         and the partial, finalized text if there has been updates to it.
         """
-        self.buffer.extend(
-            self.punct_fixer.init_word_prediction_list(
-                self.punct_fixer.split_input_text(new_text_segment)
-            )
-        )
+        new_words = self.punct_fixer.split_input_text(new_text_segment)
+        # Empty segments, e.g. silence, cannot finalize more text
+        if not new_words:
+            return None
+        self.buffer.extend(self.punct_fixer.init_word_prediction_list(new_words))
         if self.process_buffer():
             return self.get_result()
         return None
@@ -56,23 +65,28 @@ class PunctFixStreamer:
         # size and on chunk size. To avoid trying to be clever, I just calculate the chunks
         # and overlaps and sum up how many times each index will be in a chunk.
         else:
+            # If words before chunked_words were dropped, only chunks reaching into chunked_words are counted.
+            # Chunks starting a chunk size or more before word_offset cannot reach it.
+            stride = self.punct_fixer.word_chunk_size - self.punct_fixer.word_overlap
+            first_idx = max(self.word_offset - self.punct_fixer.word_chunk_size, 0) // stride * stride
+            num_words = self.word_offset + len(self.chunked_words)
             # The + chunk size makes calculation takes into account that there will be more
             # chunks in future and that we should not finalize prematurely
             final_num_preds = [0] * (
-                len(self.chunked_words) + self.punct_fixer.word_chunk_size
+                num_words - first_idx + self.punct_fixer.word_chunk_size
             )
             for chunk in self.punct_fixer.split_words_into_chunks(
-                range(len(self.chunked_words))
+                range(first_idx, num_words)
             ):
                 for idx in chunk:
-                    final_num_preds[idx] += 1
+                    final_num_preds[idx - first_idx] += 1
             finalized_words = [
                 word
                 for i, word in enumerate(self.chunked_words)
-                if len(word.labels) == final_num_preds[i]
+                if len(word.labels) == final_num_preds[self.word_offset - first_idx + i]
             ]
         return self.punct_fixer.combine_word_predictions_into_final_text(
-            finalized_words
+            finalized_words, self.auto_uppercase
         )
 
     def process_buffer(self, is_finalized=False) -> bool:
@@ -122,3 +136,60 @@ class PunctFixStreamer:
         """
         self.buffer = []
         self.chunked_words = []
+        self.word_offset = 0
+        self.auto_uppercase = False
+
+    def get_state(self) -> Dict[str, Any]:
+        """
+        Returns a JSON serializable state from which the stream can be resumed with set_state, e.g. on another
+        machine. Words that are finalized and will not be part of future chunks are left out, so the results of
+        the resumed streamer only contain the text streamed in after the left out words.
+        The number of left out words since the start of the stream is saved as word_offset.
+        """
+        stride = self.punct_fixer.word_chunk_size - self.punct_fixer.word_overlap
+        # Only whole chunk strides are dropped, such that chunks of the resumed stream line up with earlier chunks.
+        # The last word_overlap chunked words are kept as they will be part of the next chunk.
+        num_dropped = max(len(self.chunked_words) - self.punct_fixer.word_overlap, 0) // stride * stride
+        auto_uppercase = self.auto_uppercase
+        if num_dropped:
+            # The first kept word must be capitalized if the last dropped word ends a sentence
+            auto_uppercase = self.chunked_words[num_dropped - 1].label[0] in {".", "!", "?"}
+        # The first word_overlap words of the buffer are the same as the last chunked words
+        num_shared = self.punct_fixer.word_overlap if self.chunked_words else 0
+        return {
+            "word_chunk_size": self.punct_fixer.word_chunk_size,
+            "word_overlap": self.punct_fixer.word_overlap,
+            "word_offset": self.word_offset + num_dropped,
+            "auto_uppercase": auto_uppercase,
+            "chunked_words": [
+                [word.word, word.labels, word.scores] for word in self.chunked_words[num_dropped:]
+            ],
+            "buffer": [[word.word, word.labels, word.scores] for word in self.buffer[num_shared:]],
+        }
+
+    def set_state(self, state: Dict[str, Any]):
+        """
+        Resumes a stream from a state given by get_state. The punct fixer must use the same chunk size and overlap
+        as the one the state was saved with.
+        """
+        if (state["word_chunk_size"], state["word_overlap"]) != (
+            self.punct_fixer.word_chunk_size,
+            self.punct_fixer.word_overlap,
+        ):
+            raise IncompatibleStreamerState(
+                f"The state was saved with word_chunk_size={state['word_chunk_size']} and "
+                f"word_overlap={state['word_overlap']} but the punct fixer uses "
+                f"word_chunk_size={self.punct_fixer.word_chunk_size} and "
+                f"word_overlap={self.punct_fixer.word_overlap}."
+            )
+        self.chunked_words = [
+            WordPrediction(word=word, labels=list(labels), scores=list(scores))
+            for word, labels, scores in state["chunked_words"]
+        ]
+        num_shared = self.punct_fixer.word_overlap if self.chunked_words else 0
+        self.buffer = self.chunked_words[len(self.chunked_words) - num_shared:] + [
+            WordPrediction(word=word, labels=list(labels), scores=list(scores))
+            for word, labels, scores in state["buffer"]
+        ]
+        self.word_offset = state["word_offset"]
+        self.auto_uppercase = state["auto_uppercase"]
@@ -0,0 +1,63 @@
+from time import time
+import torch
+from punctfix import PunctFixer
+
+MODEL_INPUT = "det der sker over de tre dage fra præsident huden tav ankommer til københavn det er at der " \
+                "sådan en bliver spillet sådan et form for tom og jerry kispus mellem københavns politi og " \
+                "så de har danske demonstranter for tibet og fåfalungongsom meget gerne vil vise deres " \
+                "utilfredshed med det kinesiske regime og det de opfatter som undertrykkelse af de her " \
+                "mindretal i kine og lige nu står støttekomiteen for ti bedet bag en demonstration på" \
+                " højbro plads i københavn lisbeth davidsen hvor mange er der kommet det er ikke " \
+                "de store folkemasser der er mødt op her på " * 10
+
+def words_through_model(model: PunctFixer, text: str) -> int:
+    """
+    Counts the words passed through the model when punctuating the text.
+    """
+    run_pipeline = model._run_pipeline  # pylint: disable=protected-access
+    num_words = 0
+
+    def counting_run_pipeline(chunks):
+        nonlocal num_words
+        num_words += sum(len(chunk_text) for chunk_text in chunks)
+        return run_pipeline(chunks)
+
+    model._run_pipeline = counting_run_pipeline  # pylint: disable=protected-access
+    model.punctuate(text)
+    del model._run_pipeline  # pylint: disable=protected-access
+    return num_words
+
+def time_punctuate(model: PunctFixer):
+    # Warmup
+    model.punctuate(MODEL_INPUT)
+
+    times = []
+    for _ in range(5):
+        start = time()
+        model.punctuate(MODEL_INPUT)
+        times.append(time() - start)
+    return torch.tensor(times).mean().item()
+
+
+if __name__ == "__main__":
+    model = PunctFixer(language="da")
+    num_words = len(model.split_input_text(MODEL_INPUT))
+    baseline_words = words_through_model(model, MODEL_INPUT)
+    baseline_time = time_punctuate(model)
+    baseline_output = model.punctuate(MODEL_INPUT)
+    print(">>> Overlapping chunks (chunk size %i, overlap %i)" % (model.word_chunk_size, model.word_overlap))
+    print("Words through model: %i (%.2fx input)\nAverage time: %f" %
+          (baseline_words, baseline_words / num_words, baseline_time))
+
+    for threshold in [0.5, 0.7, 0.9, 0.99]:
+        model.adaptive_confidence_threshold = threshold
+        adaptive_words = words_through_model(model, MODEL_INPUT)
+        adaptive_time = time_punctuate(model)
+        adaptive_output = model.punctuate(MODEL_INPUT).split(" ")
+        agreement = sum(a == b for a, b in zip(adaptive_output, baseline_output.split(" "))) / len(adaptive_output)
+        print(">>> Adaptive overlap with confidence threshold %.2f" % threshold)
+        print("Words through model: %i (%.2fx input, %.1f%% compute saved)\nAverage time: %f\n"
+              "Word agreement with overlapping chunks: %.3f" %
+              (adaptive_words, adaptive_words / num_words, 100 * (1 - adaptive_words / baseline_words),
+               adaptive_time, agreement))
+        model.adaptive_confidence_threshold = None
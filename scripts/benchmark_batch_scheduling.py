@@ -0,0 +1,53 @@
+from time import time
+import torch
+from punctfix import PunctFixer
+
+MODEL_INPUT = "det der sker over de tre dage fra præsident huden tav ankommer til københavn det er at der " \
+                "sådan en bliver spillet sådan et form for tom og jerry kispus mellem københavns politi og " \
+                "så de har danske demonstranter for tibet og fåfalungongsom meget gerne vil vise deres " \
+                "utilfredshed med det kinesiske regime og det de opfatter som undertrykkelse af de her " \
+                "mindretal i kine og lige nu står støttekomiteen for ti bedet bag en demonstration på" \
+                " højbro plads i københavn lisbeth davidsen hvor mange er der kommet det er ikke " \
+                "de store folkemasser der er mødt op her på "
+
+# Documents of very different lengths give chunks of very different token lengths
+MODEL_INPUTS = [" ".join(MODEL_INPUT.split()[:n]) for n in (5, 12, 30, 60, 90, 99)] * 8
+
+def time_documents(model: PunctFixer):
+    # Warmup potential CUDA device
+    model.punctuate(MODEL_INPUTS[0])
+
+    times = []
+    for _ in range(3):
+        start = time()
+        model.populate_word_prediction_with_labels(
+            [model.split_input_text(text) for text in MODEL_INPUTS],
+            model.init_word_prediction_list(model.split_input_text(" ".join(MODEL_INPUTS))),
+            chunk_starts=[sum(len(text.split()) for text in MODEL_INPUTS[:i]) for i in range(len(MODEL_INPUTS))]
+        )
+        times.append(time() - start)
+    return torch.tensor(times).mean().item()
+
+
+if __name__ == "__main__":
+    devices = ["cpu"]
+    if torch.cuda.is_available():
+        devices.append("cuda")
+    for device in devices:
+        model = PunctFixer(language="da", device=device)
+        lengths = model.get_token_lengths(MODEL_INPUTS)
+        for batch_size in [16, 32, 64]:
+            model.batch_size = batch_size
+            batches = [list(range(i, min(i + batch_size, len(MODEL_INPUTS))))
+                       for i in range(0, len(MODEL_INPUTS), batch_size)]
+            print(">>> Device %s, fixed batch size %i" % (device, batch_size))
+            print("Padding efficiency: %f\nAverage time: %f" %
+                  (model.padding_efficiency(lengths, batches), time_documents(model)))
+
+        for max_tokens in [1024, 2048, 4096]:
+            model.max_tokens_per_batch = max_tokens
+            batches = model.schedule_batches(MODEL_INPUTS)
+            print(">>> Device %s, max %i tokens per batch (%i batches)" % (device, max_tokens, len(batches)))
+            print("Padding efficiency: %f\nAverage time: %f" %
+                  (model.padding_efficiency(lengths, batches), time_documents(model)))
+        model.max_tokens_per_batch = None
@@ -0,0 +1,44 @@
+from time import time
+import torch
+from punctfix import PunctFixer
+
+MODEL_INPUT = "det der sker over de tre dage fra præsident huden tav ankommer til københavn det er at der " \
+                "sådan en bliver spillet sådan et form for tom og jerry kispus mellem københavns politi og " \
+                "så de har danske demonstranter for tibet og fåfalungongsom meget gerne vil vise deres " \
+                "utilfredshed med det kinesiske regime og det de opfatter som undertrykkelse af de her " \
+                "mindretal i kine og lige nu står støttekomiteen for ti bedet bag en demonstration på" \
+                " højbro plads i københavn lisbeth davidsen hvor mange er der kommet det er ikke " \
+                "de store folkemasser der er mødt op her på "
+
+# Short utterances of 5-20 words
+MODEL_INPUTS = [" ".join(MODEL_INPUT.split()[i:i + 5 + i % 16]) for i in range(100)] * 5
+
+def time_fp(model: PunctFixer):
+    # Warmup potential CUDA device
+    model.punctuate_batch(MODEL_INPUTS[:10])
+
+    times = []
+    for _ in range(3):
+        start = time()
+        model.punctuate_batch(MODEL_INPUTS)
+        times.append(time() - start)
+    return torch.tensor(times).mean().item()
+
+
+if __name__ == "__main__":
+    devices = ["cpu"]
+    if torch.cuda.is_available():
+        devices.append("cuda")
+    for device in devices:
+        model = PunctFixer(language="da", device=device)
+        # Tokens of the words themselves, i.e. without special tokens and padding
+        num_tokens = sum(model.get_token_lengths(MODEL_INPUTS)) \
+            - len(MODEL_INPUTS) * model.tokenizer.num_special_tokens_to_add()
+        for batch_size in [16, 64]:
+            model.batch_size = batch_size
+            for max_packed_tokens in [None, 128, 256, 512]:
+                model.max_packed_tokens = max_packed_tokens
+                avg_time = time_fp(model)
+                print(">>> Device %s, batch size %i, max packed tokens %s" %
+                      (device, batch_size, max_packed_tokens))
+                print("Average time: %f\nEffective tokens per second: %f" % (avg_time, num_tokens / avg_time))
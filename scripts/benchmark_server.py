@@ -0,0 +1,73 @@
+import argparse
+import asyncio
+from time import time
+import torch
+from punctfix import PunctFixer
+from punctfix.server import PunctFixServer, read_message, write_message
+
+MODEL_INPUT = "det der sker over de tre dage fra præsident huden tav ankommer til københavn det er at der " \
+                "sådan en bliver spillet sådan et form for tom og jerry kispus mellem københavns politi og " \
+                "så de har danske demonstranter for tibet og fåfalungongsom meget gerne vil vise deres " \
+                "utilfredshed med det kinesiske regime og det de opfatter som undertrykkelse af de her " \
+                "mindretal i kine og lige nu står støttekomiteen for ti bedet bag en demonstration på" \
+                " højbro plads i københavn lisbeth davidsen hvor mange er der kommet det er ikke " \
+                "de store folkemasser der er mødt op her på " * 3
+
+async def stream(port: int, words_per_segment: int, segment_interval: float):
+    """
+    Streams MODEL_INPUT in segments like an ASR system, returning the time from finalizing
+    until the final text was received.
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    words = MODEL_INPUT.split()
+
+    async def receive():
+        while True:
+            message = await read_message(reader)
+            if message is None:
+                raise RuntimeError("The server closed the connection before the stream was finalized.")
+            if "error" in message:
+                raise RuntimeError(message["error"])
+            if message["final"]:
+                return time()
+
+    receiver = asyncio.ensure_future(receive())
+    for i in range(0, len(words), words_per_segment):
+        await write_message(writer, {"text": " ".join(words[i:i + words_per_segment])})
+        await asyncio.sleep(segment_interval)
+    finalized_at = time()
+    await write_message(writer, {"finalize": True})
+    received_at = await receiver
+    writer.close()
+    return received_at - finalized_at
+
+async def load(port: int, num_streams: int, words_per_segment: int, segment_interval: float):
+    start = time()
+    latencies = await asyncio.gather(*[stream(port, words_per_segment, segment_interval)
+                                       for _ in range(num_streams)])
+    total_time = time() - start
+    print(">>> %i streams, %i words per segment, %.3f s between segments" %
+          (num_streams, words_per_segment, segment_interval))
+    print("Total time: %f\nWords per second: %f\nAverage finalize latency: %f" %
+          (total_time, num_streams * len(MODEL_INPUT.split()) / total_time, torch.tensor(latencies).mean().item()))
+
+async def main(args):
+    server = None
+    port = args.port
+    if port is None:
+        server = PunctFixServer(PunctFixer(language="da", batch_size=32), port=0)
+        await server.start()
+        port = server.port
+    for num_streams in [1, 8, 32, 128]:
+        await load(port, num_streams, args.words_per_segment, args.segment_interval)
+    if server is not None:
+        await server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load generator for the local punctuation server.")
+    parser.add_argument("--port", type=int, default=None,
+                        help="Port of a running server. If not given, a server is started in this process.")
+    parser.add_argument("--words-per-segment", type=int, default=3)
+    parser.add_argument("--segment-interval", type=float, default=0.0)
+    asyncio.run(main(parser.parse_args()))
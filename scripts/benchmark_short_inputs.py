@@ -0,0 +1,47 @@
+from time import time
+import torch
+from punctfix import PunctFixer
+
+MODEL_INPUT = "det der sker over de tre dage fra præsident huden tav ankommer til københavn det er at der " \
+                "sådan en bliver spillet sådan et form for tom og jerry kispus mellem københavns politi og " \
+                "så de har danske demonstranter for tibet og fåfalungongsom meget gerne vil vise deres " \
+                "utilfredshed med det kinesiske regime og det de opfatter som undertrykkelse af de her "
+
+NUM_WORDS = [0, 1, 2, 5, 10, 20]
+NUM_CALLS = 50
+
+
+def time_per_call(function, text: str):
+    # Warmup potential CUDA device
+    function(text)
+
+    start = time()
+    for _ in range(NUM_CALLS):
+        function(text)
+    return (time() - start) / NUM_CALLS
+
+
+def forward_only(model: PunctFixer):
+    # Time of the model itself, i.e. what is left when the overhead of a call is removed
+    def forward(text: str):
+        if text:
+            model.forward_chunks(model.tokenize_chunks([text.split()]))
+    return forward
+
+
+if __name__ == "__main__":
+    devices = ["cpu"]
+    if torch.cuda.is_available():
+        devices.append("cuda")
+    for device in devices:
+        model = PunctFixer(language="da", device=device)
+        for num_words in NUM_WORDS:
+            text = " ".join(MODEL_INPUT.split()[:num_words])
+            model.short_input_words = 0
+            pipeline_time = time_per_call(model.punctuate, text)
+            model.short_input_words = 100
+            fast_path_time = time_per_call(model.punctuate, text)
+            model_time = time_per_call(forward_only(model), text)
+            print(">>> Device %s, %i words" % (device, num_words))
+            print("Pipeline: %.2f ms per call\nFast path: %.2f ms per call\nModel only: %.2f ms per call" %
+                  (pipeline_time * 1000, fast_path_time * 1000, model_time * 1000))
@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from time import time
+import torch
+from punctfix import PunctFixer
+
+MODEL_INPUT = "det der sker over de tre dage fra præsident huden tav ankommer til københavn det er at der " \
+                "sådan en bliver spillet sådan et form for tom og jerry kispus mellem københavns politi og " \
+                "så de har danske demonstranter for tibet og fåfalungongsom meget gerne vil vise deres " \
+                "utilfredshed med det kinesiske regime og det de opfatter som undertrykkelse af de her " \
+                "mindretal i kine og lige nu står støttekomiteen for ti bedet bag en demonstration på" \
+                " højbro plads i københavn lisbeth davidsen hvor mange er der kommet det er ikke " \
+                "de store folkemasser der er mødt op her på "
+
+MODEL_INPUTS = [" ".join(MODEL_INPUT.split()[i:i + 10 + i % 30]) for i in range(50)] * 4
+
+def time_threads(model: PunctFixer, num_threads: int, global_lock: bool):
+    lock = Lock()
+
+    def punctuate(text: str) -> str:
+        if global_lock:
+            with lock:
+                return model.punctuate(text)
+        return model.punctuate(text)
+
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        # Warmup, also creating the tokenizer and pipeline of each thread
+        list(executor.map(punctuate, MODEL_INPUTS[:num_threads * 2]))
+
+        times = []
+        for _ in range(3):
+            start = time()
+            list(executor.map(punctuate, MODEL_INPUTS))
+            times.append(time() - start)
+    return torch.tensor(times).mean().item()
+
+
+if __name__ == "__main__":
+    model = PunctFixer(language="da", batch_size=16)
+    for num_threads in [1, 4, 8, 16]:
+        for global_lock, merge_concurrent_calls in (True, False), (False, False), (False, True):
+            model.merge_concurrent_calls = merge_concurrent_calls
+            avg_time = time_threads(model, num_threads, global_lock)
+            print(">>> %i threads, global lock %s, merge concurrent calls %s" %
+                  (num_threads, global_lock, merge_concurrent_calls))
+            print("Average time: %f\nRequests per second: %f" % (avg_time, len(MODEL_INPUTS) / avg_time))
@@ -1,9 +1,18 @@
+import asyncio
+import copy
+import json
+import struct
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch, MagicMock, ANY
 
+import torch
+
 from punctfix import PunctFixer
-from punctfix.inference import NonNormalizedTextWarning
-from punctfix.streaming import PunctFixStreamer
+from punctfix.inference import NonNormalizedTextWarning, WordPrediction
+from punctfix.streaming import PunctFixStreamer, IncompatibleStreamerState
+from punctfix.server import PunctFixServer, read_message, write_message
 
 class CleanupDisableTest(unittest.TestCase):
 
@@ -158,6 +167,578 @@ class HandlingOfLargeTextsTest(unittest.TestCase):
             self.assertIsNotNone(actual_output)
 
 
+class AdaptiveOverlapTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.model = PunctFixer(language="da", adaptive_confidence_threshold=0.9)
+        self.long_text = "det der sker over de tre dage fra præsident huden tav ankommer til københavn det er at der " \
+                         "sådan en bliver spillet sådan et form for tom og jerry kispus mellem københavns politi og " \
+                         "så de har danske demonstranter for tibet og fåfalungongsom meget gerne vil vise deres " \
+                         "utilfredshed med det kinesiske regime og det de opfatter som undertrykkelse af de her " \
+                         "mindretal i kine og lige nu står støttekomiteen for ti bedet bag en demonstration på" \
+                         " højbro plads i københavn lisbeth davidsen hvor mange er der kommet det er ikke " \
+                         "de store folkemasser der er mødt op her på " * 3
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        self.model = None
+        self.long_text = None
+
+    def test_short_text_same_as_overlapping_chunks(self):
+        model_input = "mit navn det er rasmus og jeg kommer fra firmaet alvenir " \
+                      "det er mig som har trænet denne lækre model"
+        expected_output = "Mit navn det er Rasmus og jeg kommer fra firmaet Alvenir. " \
+                          "Det er mig som har trænet denne lækre model."
+
+        actual_output = self.model.punctuate(model_input)
+
+        self.assertEqual(actual_output, expected_output)
+
+    def test_all_words_get_labels(self):
+        words = self.model.split_input_text(self.long_text)
+        word_prediction_list = self.model.populate_word_prediction_adaptively(
+            words, self.model.init_word_prediction_list(words)
+        )
+        self.assertEqual([word_pred.word for word_pred in word_prediction_list], words)
+        for word_pred in word_prediction_list:
+            self.assertGreater(len(word_pred.labels), 0)
+            self.assertEqual(len(word_pred.labels), len(word_pred.scores))
+
+        output = self.model.punctuate(self.long_text)
+        self.assertEqual(len(output.split(" ")), len(words))
+
+    def test_multiple_thresholds_and_chunk_sizes(self):
+        for threshold in 0.0, 0.5, 0.99, 1.0:
+            for chunk_size in 50, 100, 150:
+                self.model.adaptive_confidence_threshold = threshold
+                self.model.word_chunk_size = chunk_size
+
+                actual_output = self.model.punctuate(self.long_text)
+                self.assertEqual(len(actual_output.split(" ")), len(self.model.split_input_text(self.long_text)))
+
+    def test_low_score_word_is_rerun(self):
+        words = self.model.split_input_text(self.long_text)
+        planted = 40
+        run_pipeline = self.model._run_pipeline
+        first_pass = []
+
+        def planted_run_pipeline(chunks):
+            outputs = run_pipeline(chunks)
+            if not first_pass:
+                # Every word of the first pass is confident except the planted word
+                for output in outputs:
+                    for entity in output:
+                        entity["score"] = 1.0
+                outputs[0][planted]["score"] = 0.01
+                first_pass.extend(outputs)
+            return outputs
+
+        with patch.object(self.model, "_run_pipeline", side_effect=planted_run_pipeline):
+            word_prediction_list = self.model.predict_words(words)
+
+        chunk_size = self.model.word_chunk_size
+        margin = self.model.adaptive_edge_margin
+        # Each word has its own entity and score
+        self.assertEqual([len(output) for output in first_pass], [len(words[i:i + chunk_size])
+                                                                  for i in range(0, len(words), chunk_size)])
+        flagged = {planted} | {i for edge in range(chunk_size, len(words), chunk_size)
+                               for i in range(edge - margin, edge + margin)}
+        self.assertGreater(len(word_prediction_list[planted].labels), 1)
+        for i, word_pred in enumerate(word_prediction_list):
+            if i not in flagged:
+                self.assertEqual(word_pred.labels, [first_pass[i // chunk_size][i % chunk_size]["entity_group"]])
+
+    def test_place_windows(self):
+        self.model.word_chunk_size = 100
+        # Close flagged words share a window, far away ones get their own
+        self.assertEqual(self.model._place_windows([90, 95, 110, 400], 1000, 25), [(65, 136), (375, 426)])
+        # Windows are cut at the text boundaries
+        self.assertEqual(self.model._place_windows([3, 998], 1000, 25), [(0, 29), (973, 1000)])
+        # Windows never exceed the chunk size
+        windows = self.model._place_windows(list(range(100, 300)), 1000, 49)
+        for start, end in windows:
+            self.assertLessEqual(end - start, 100)
+        covered = {i for start, end in windows for i in range(start, end)}
+        self.assertTrue(set(range(100, 300)).issubset(covered))
+
+
+class BatchSchedulingTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.model = PunctFixer(language="da", max_tokens_per_batch=512)
+        self.texts = ["mit navn det er rasmus", "og jeg kommer fra firmaet alvenir det er mig som har trænet denne",
+                      "lækre", "model", "en dag bliver vi sku glade for at vi nu kan sætte punktummer"]
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        self.model = None
+        self.texts = None
+
+    def test_same_output_as_fixed_batch_size(self):
+        model_input = "mit navn det er rasmus og jeg kommer fra firmaet alvenir " \
+                      "det er mig som har trænet denne lækre model " * 10
+        for max_tokens in 16, 100, 512, 4096:
+            self.model.max_tokens_per_batch = max_tokens
+            bucketed_output = self.model.punctuate(model_input)
+            self.model.max_tokens_per_batch = None
+            fixed_output = self.model.punctuate(model_input)
+            self.assertEqual(bucketed_output, fixed_output)
+
+    def test_schedule_batches(self):
+        lengths = self.model.get_token_lengths(self.texts)
+        for max_tokens in 1, 20, 40, 1000:
+            self.model.max_tokens_per_batch = max_tokens
+            batches = self.model.schedule_batches(self.texts)
+            # All texts are scheduled exactly once
+            self.assertEqual(sorted(i for batch in batches for i in batch), list(range(len(self.texts))))
+            for batch in batches:
+                self.assertTrue(len(batch) == 1 or len(batch) * max(lengths[i] for i in batch) <= max_tokens)
+        self.assertEqual(len(batches), 1)
+
+    def test_padding_efficiency(self):
+        self.assertEqual(self.model.padding_efficiency([3, 3, 3], [[0, 1, 2]]), 1.0)
+        self.assertEqual(self.model.padding_efficiency([2, 4], [[0, 1]]), 0.75)
+        self.assertEqual(self.model.padding_efficiency([2, 4], [[0], [1]]), 1.0)
+
+
+class DirectPathTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        # All chunks are shorter than this, so they are predicted without the pipeline
+        self.model = PunctFixer(language="da", short_input_words=101)
+        self.long_text = "mit navn det er rasmus og jeg kommer fra firmaet alvenir " \
+                         "det er mig som har trænet denne lækre model " * 20
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        self.model = None
+        self.long_text = None
+
+    def test_sample01(self):
+        model_input = "mit navn det er rasmus og jeg kommer fra firmaet alvenir " \
+                      "det er mig som har trænet denne lækre model"
+        expected_output = "Mit navn det er Rasmus og jeg kommer fra firmaet Alvenir. " \
+                          "Det er mig som har trænet denne lækre model."
+
+        actual_output = self.model.punctuate(model_input)
+
+        self.assertEqual(actual_output, expected_output)
+
+    def test_same_output_as_pipeline(self):
+        for batch_size, max_tokens_per_batch in (1, None), (4, None), (16, 1024):
+            self.model.batch_size = batch_size
+            self.model.max_tokens_per_batch = max_tokens_per_batch
+            self.model.short_input_words = 101
+            direct_output = self.model.punctuate(self.long_text)
+            self.model.short_input_words = 0
+            pipeline_output = self.model.punctuate(self.long_text)
+            self.assertEqual(direct_output, pipeline_output)
+
+    def test_empty_input(self):
+        self.assertEqual(self.model.punctuate(""), "")
+
+    def test_forward_error_is_raised(self):
+        self.model.batch_size = 1
+        with patch.object(self.model, "forward_chunks", side_effect=RuntimeError("forward failed")):
+            with self.assertRaises(RuntimeError):
+                self.model.punctuate(self.long_text)
+
+    def test_alignment_error_is_raised(self):
+        self.model.batch_size = 1
+        with patch.object(self.model, "align_labels", side_effect=RuntimeError("alignment failed")):
+            with self.assertRaises(RuntimeError):
+                self.model.punctuate(self.long_text)
+
+
+class SequencePackingTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.model = PunctFixer(language="da", batch_size=8)
+        words = ("mit navn det er rasmus og jeg kommer fra firmaet alvenir "
+                 "det er mig som har trænet denne lækre model " * 10).split()
+        self.texts = [" ".join(words[:num_words]) for num_words in (5, 0, 12, 1, 20, 99, 100, 170)]
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        self.model = None
+        self.texts = None
+
+    def test_punctuate_batch(self):
+        expected_output = [self.model.punctuate(text) for text in self.texts]
+
+        actual_output = self.model.punctuate_batch(self.texts)
+
+        self.assertEqual(actual_output, expected_output)
+
+    def test_same_output_as_unpacked(self):
+        expected_output = [self.model.punctuate(text) for text in self.texts]
+        for max_packed_tokens in 32, 128, 512:
+            self.model.max_packed_tokens = max_packed_tokens
+            actual_output = self.model.punctuate_batch(self.texts)
+            self.assertEqual(actual_output, expected_output)
+
+    def test_rows_longer_than_model_max_length(self):
+        texts = [text for text in self.texts if 0 < len(text.split()) <= 20] * 30
+        expected_output = [self.model.punctuate(text) for text in texts]
+        self.model.max_packed_tokens = 2048
+        lengths = self.model.get_token_lengths(texts)
+        row_lengths = [sum(lengths[i] for i in row) for row in self.model.pack_rows(lengths)]
+        self.assertGreater(max(row_lengths), self.model.model.config.max_position_embeddings)
+
+        actual_output = self.model.punctuate_batch(texts)
+
+        self.assertEqual(actual_output, expected_output)
+
+    def test_pack_rows(self):
+        self.model.max_packed_tokens = 10
+        rows = self.model.pack_rows([4, 6, 3, 12, 5, 2])
+        self.assertEqual(rows, [[3], [1, 0], [4, 2, 5]])
+
+
+class StructuredOutputTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.model = PunctFixer(language="da")
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        self.model = None
+
+    def test_sample01(self):
+        model_input = "mit navn det er rasmus og jeg kommer fra firmaet alvenir " \
+                      "det er mig som har trænet denne lækre model"
+
+        actual_output = self.model.punctuate_structured(model_input)
+
+        self.assertEqual(actual_output.words, model_input.split(" "))
+        self.assertEqual(actual_output.word_indices.tolist(), list(range(20)))
+        self.assertEqual(actual_output.capitalized.nonzero().flatten().tolist(), [0, 4, 10, 11])
+        self.assertEqual([actual_output.punctuation_marks[i] for i in actual_output.punctuation_ids.tolist()],
+                         [""] * 10 + ["."] + [""] * 8 + ["."])
+        self.assertIsNone(actual_output.confidences)
+        self.assertEqual(actual_output.to_text(), self.model.punctuate(model_input))
+
+    def test_same_text_as_punctuate(self):
+        model_input = "en dag bliver vi sku glade for at vi nu kan sætte punktummer " \
+                      "og kommaer i en sætning det fungerer da meget godt ikke " * 10
+        for chunk_size, overlap in (100, 70), (50, 10):
+            self.model.word_chunk_size = chunk_size
+            self.model.word_overlap = overlap
+
+            actual_output = self.model.punctuate_structured(model_input, return_confidence=True)
+
+            self.assertEqual(actual_output.to_text(), self.model.punctuate(model_input))
+            self.assertEqual(len(actual_output.confidences), len(actual_output.words))
+
+    def test_pre_split_words(self):
+        model_input = ["Mit", "navn", "", "det", "%", "er", "rasmus!"]
+
+        actual_output = self.model.punctuate_structured(model_input)
+
+        self.assertEqual(actual_output.words, self.model.split_input_text(" ".join(model_input)))
+        self.assertEqual(actual_output.word_indices.tolist(), [0, 1, 3, 5, 6])
+        self.assertEqual(actual_output.to_text(), self.model.punctuate(" ".join(model_input)))
+
+    def test_confidences_same_on_all_paths(self):
+        model_input = "en dag bliver vi sku glade for at vi nu kan sætte punktummer " \
+                      "og kommaer i en sætning det fungerer da meget godt ikke " * 10
+        expected_output = self.model.punctuate_structured(model_input, return_confidence=True)
+
+        for short_input_words, max_packed_tokens in (101, None), (0, 512):
+            self.model.short_input_words = short_input_words
+            self.model.max_packed_tokens = max_packed_tokens
+
+            actual_output = self.model.punctuate_structured(model_input, return_confidence=True)
+
+            self.assertEqual(actual_output.punctuation_ids.tolist(), expected_output.punctuation_ids.tolist())
+            self.assertTrue(torch.allclose(actual_output.confidences, expected_output.confidences, atol=1e-4))
+
+    def test_confidence_of_chosen_label(self):
+        word_prediction = WordPrediction(word="navn", labels=["O", ",O", "O"], scores=[0.9, 0.4, 0.7])
+        self.assertEqual(word_prediction.label, "O")
+        self.assertAlmostEqual(word_prediction.confidence, 0.8)
+        self.assertEqual(WordPrediction(word="navn", labels=["O"]).confidence, 1.0)
+
+    def test_empty_input(self):
+        actual_output = self.model.punctuate_structured([])
+        self.assertEqual(actual_output.words, [])
+        self.assertEqual(actual_output.to_text(), "")
+
+
+class ThreadSafetyTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.model = PunctFixer(language="da", batch_size=8)
+        words = ("mit navn det er rasmus og jeg kommer fra firmaet alvenir det er mig som har trænet denne lækre "
+                 "model en dag bliver vi sku glade for at vi nu kan sætte punktummer og kommaer i en sætning "
+                 "det fungerer da meget godt ikke " * 5).split()
+        self.texts = [" ".join(words[i:i + 3 + (7 * i) % 150]) for i in range(48)]
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        self.model = None
+        self.texts = None
+
+    def _assert_same_output_in_threads(self):
+        expected_output = [self.model.punctuate(text) for text in self.texts]
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            for _ in range(3):
+                actual_output = list(executor.map(self.model.punctuate, self.texts))
+                self.assertEqual(actual_output, expected_output)
+
+    def test_concurrent_calls(self):
+        self._assert_same_output_in_threads()
+
+    def test_merged_concurrent_calls(self):
+        self.model.merge_concurrent_calls = True
+        self._assert_same_output_in_threads()
+
+    def test_merged_concurrent_calls_with_packing(self):
+        self.model.merge_concurrent_calls = True
+        self.model.max_packed_tokens = 512
+        self._assert_same_output_in_threads()
+
+    def test_concurrent_calls_with_other_batching(self):
+        self.model.short_input_words = 101
+        self._assert_same_output_in_threads()
+        self.model.short_input_words = 0
+        self.model.max_tokens_per_batch = 1024
+        self._assert_same_output_in_threads()
+
+    def test_merged_error_is_raised(self):
+        self.model.merge_concurrent_calls = True
+        with patch.object(self.model, "_run_pipeline", side_effect=RuntimeError("prediction failed")):
+            with self.assertRaises(RuntimeError):
+                self.model.punctuate(self.texts[0])
+        # The fixer still works after the error
+        self.assertEqual(self.model.punctuate(self.texts[1]), self.model.punctuate_batch([self.texts[1]])[0])
+
+
+    def test_deepcopy(self):
+        model_copy = copy.deepcopy(self.model)
+        self.model.merge_concurrent_calls = True
+        model_copy.merge_concurrent_calls = True
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            self.assertEqual(list(executor.map(model_copy.punctuate, self.texts[:8])),
+                             list(executor.map(self.model.punctuate, self.texts[:8])))
+
+    def test_reassigned_pipe_is_used(self):
+        pipe = self.model.pipe
+        with patch.object(self.model, "pipe", side_effect=pipe) as patched_pipe:
+            self.model.punctuate(self.texts[0])
+            patched_pipe.assert_called()
+
+    def test_merged_error_only_raised_for_failing_call(self):
+        self.model.merge_concurrent_calls = True
+        texts = self.texts[:8] + ["fejl " + self.texts[8]]
+        expected_output = [self.model.punctuate(text) for text in texts[:-1]]
+        run_pipeline = self.model._run_pipeline
+        merged_calls = []
+
+        def failing_run_pipeline(chunks):
+            # Slow enough that calls from the other threads are merged
+            time.sleep(0.1)
+            merged_calls.append(len(chunks))
+            if any("fejl" in chunk_text for chunk_text in chunks):
+                raise RuntimeError("prediction failed")
+            return run_pipeline(chunks)
+
+        with patch.object(self.model, "_run_pipeline", side_effect=failing_run_pipeline):
+            with ThreadPoolExecutor(max_workers=len(texts)) as executor:
+                futures = [executor.submit(self.model.punctuate, text) for text in texts]
+                actual_output = [future.result() for future in futures[:-1]]
+                with self.assertRaises(RuntimeError):
+                    futures[-1].result()
+
+        self.assertEqual(actual_output, expected_output)
+        self.assertGreater(max(merged_calls), 1)
+
+
+class ShortInputTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.model = PunctFixer(language="da", batch_size=4)
+        words = ("mit navn det er rasmus og jeg kommer fra firmaet alvenir det er mig som har trænet denne lækre "
+                 "model en dag bliver vi sku glade for at vi nu kan sætte punktummer og kommaer i en sætning "
+                 "det fungerer da meget godt ikke " * 5).split()
+        self.texts = [" ".join(words[:n]) for n in (1, 0, 5, 12, 150, 2, 20)]
+        self.expected_output = [self.model.punctuate(text) for text in self.texts]
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        self.model = None
+        self.texts = None
+        self.expected_output = None
+
+    def test_empty_input_skips_model(self):
+        self.model.short_input_words = 10
+        with patch.object(self.model, "forward_chunks") as forward_chunks, \
+                patch.object(self.model, "_run_batched") as run_batched:
+            self.assertEqual(self.model.punctuate(""), "")
+            self.assertEqual(self.model.punctuate("   "), "")
+            self.assertEqual(self.model.punctuate_batch(["", " "]), ["", ""])
+            forward_chunks.assert_not_called()
+            run_batched.assert_not_called()
+
+    def test_short_inputs_same_output(self):
+        for short_input_words in [3, 10, 200]:
+            self.model.short_input_words = short_input_words
+            self.assertEqual([self.model.punctuate(text) for text in self.texts], self.expected_output)
+            self.assertEqual(self.model.punctuate_batch(self.texts), self.expected_output)
+
+    def test_short_inputs_skip_pipeline(self):
+        self.model.short_input_words = 10
+        with patch.object(self.model, "pipe") as pipe:
+            self.assertEqual(self.model.punctuate(self.texts[2]), self.expected_output[2])
+            pipe.assert_not_called()
+
+    def test_short_inputs_are_batched(self):
+        self.model.short_input_words = 200
+        forward_chunks = self.model.forward_chunks
+        with patch.object(self.model, "forward_chunks", side_effect=forward_chunks) as patched_forward_chunks:
+            self.assertEqual(self.model.punctuate_batch(self.texts), self.expected_output)
+            self.assertGreater(patched_forward_chunks.call_count, 1)
+            self.assertTrue(all(len(call.args[0]["input_ids"]) <= self.model.batch_size
+                                for call in patched_forward_chunks.call_args_list))
+
+    def test_short_inputs_are_packed(self):
+        self.model.short_input_words = 200
+        self.model.max_packed_tokens = 512
+        with patch.object(self.model, "forward_chunks") as forward_chunks:
+            self.assertEqual(self.model.punctuate_batch(self.texts), self.expected_output)
+            forward_chunks.assert_not_called()
+
+    def test_streamer_ignores_empty_segments(self):
+        self.model.short_input_words = 10
+        streamer = PunctFixStreamer(self.model)
+        expected_streamer = PunctFixStreamer(self.model)
+        for text in self.texts[4].split():
+            self.assertEqual(streamer(text), expected_streamer(text))
+            self.assertIsNone(streamer(" "))
+        self.assertEqual(streamer.finalize(), expected_streamer.finalize())
+
+
+class PunctFixServerTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.model = PunctFixer(language="da", batch_size=8)
+        self.words = ("mit navn det er rasmus og jeg kommer fra firmaet alvenir det er mig som har trænet denne "
+                      "lækre model en dag bliver vi sku glade for at vi nu kan sætte punktummer og kommaer i en "
+                      "sætning det fungerer da meget godt ikke " * 5).split()
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        self.model = None
+        self.words = None
+
+    @staticmethod
+    async def _stream(port, words, words_per_segment=3, host="127.0.0.1"):
+        reader, writer = await asyncio.open_connection(host, port)
+        for i in range(0, len(words), words_per_segment):
+            await write_message(writer, {"text": " ".join(words[i:i + words_per_segment])})
+        await write_message(writer, {"finalize": True})
+        messages = []
+        while not messages or not messages[-1].get("final", True):
+            messages.append(await read_message(reader))
+        writer.close()
+        return messages
+
+    def test_concurrent_streams(self):
+        documents = [self.words[i:i + 20 + 9 * i] for i in range(12)]
+
+        async def run():
+            server = PunctFixServer(self.model, port=0, max_pending_segments=2)
+            await server.start()
+            try:
+                return await asyncio.gather(*[self._stream(server.port, words) for words in documents])
+            finally:
+                await server.close()
+
+        for words, messages in zip(documents, asyncio.run(run())):
+            streamer = PunctFixStreamer(self.model)
+            streamer(" ".join(words))
+            self.assertEqual("".join(message["delta"] for message in messages), streamer.finalize())
+            self.assertTrue(messages[-1]["final"])
+            self.assertFalse(any(message["final"] for message in messages[:-1]))
+
+    def test_invalid_messages(self):
+        async def run():
+            server = PunctFixServer(self.model, port=0)
+            await server.start()
+            responses = []
+            try:
+                for data in (struct.pack(">I", 3) + b"[1]", struct.pack(">I", 1 << 30)):
+                    reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+                    writer.write(data)
+                    await writer.drain()
+                    responses.append((await read_message(reader), await read_message(reader)))
+                    writer.close()
+            finally:
+                await server.close()
+            return responses
+
+        for error_message, closed in asyncio.run(run()):
+            self.assertIn("error", error_message)
+            self.assertIsNone(closed)
+
+    def test_disconnect_in_message(self):
+        async def run():
+            server = PunctFixServer(self.model, port=0)
+            await server.start()
+            try:
+                for _ in range(5):
+                    _, writer = await asyncio.open_connection("127.0.0.1", server.port)
+                    writer.write(struct.pack(">I", 100) + b'{"text": ')
+                    await writer.drain()
+                    writer.close()
+                await asyncio.sleep(0.5)
+                return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            finally:
+                await server.close()
+
+        self.assertEqual(asyncio.run(run()), [])
+
+    def test_merge_concurrent_calls_restored(self):
+        async def run():
+            server = PunctFixServer(self.model, port=0)
+            await server.start()
+            self.assertTrue(self.model.merge_concurrent_calls)
+            await server.close()
+
+        asyncio.run(run())
+        self.assertFalse(self.model.merge_concurrent_calls)
+
+    def test_only_localhost(self):
+        for host in ("8.8.8.8", "2001:4860:4860::8888"):
+            with self.assertRaises(ValueError):
+                PunctFixServer(self.model, host=host)
+
+    def test_ipv6_localhost(self):
+        async def run():
+            server = PunctFixServer(self.model, host="::1", port=0)
+            try:
+                await server.start()
+            except OSError:
+                self.skipTest("IPv6 is not available")
+            try:
+                return await self._stream(server.port, self.words[:10], host="::1")
+            finally:
+                await server.close()
+
+        messages = asyncio.run(run())
+        streamer = PunctFixStreamer(self.model)
+        streamer(" ".join(self.words[:10]))
+        self.assertEqual("".join(message["delta"] for message in messages), streamer.finalize())
+
+
 class GenerelFunctionalityTest(unittest.TestCase):
 
     def setUp(self) -> None:
@@ -170,7 +751,7 @@ class GenerelFunctionalityTest(unittest.TestCase):
         self.torch_cuda_mock.return_value = False
 
         self.token_classification_pipeline_patch = patch(
-            'punctfix.inference.TokenClassificationPipeline'
+            'punctfix.inference.WordTokenClassificationPipeline'
         )
         self.token_classification_pipeline_mock: MagicMock = self.token_classification_pipeline_patch.start()
 
@@ -341,5 +922,36 @@ class PunctFixStreamerTest(unittest.TestCase):
         self.assertEqual(self.streamer.buffer, [])
         self.assertEqual(self.streamer.chunked_words, [])
 
+    def test_resume_from_state(self):
+        model_input = ("mit navn det er rasmus og jeg kommer fra firmaet alvenir " \
+                       "det er mig som har trænet denne lækre model " * 15).split()
+        for word in model_input:
+            self.streamer(word)
+        expected_output = self.streamer.finalize().split(" ")
+
+        for cut in 5, 100, 150, 301:
+            for word in model_input[:cut]:
+                self.streamer(word)
+            state = json.loads(json.dumps(self.streamer.get_state()))
+            self.streamer.clear()
+
+            resumed_streamer = PunctFixStreamer(self.streamer.punct_fixer)
+            resumed_streamer.set_state(state)
+            # Only words that are not finalized are kept in the state
+            self.assertLessEqual(len(state["chunked_words"]) + len(state["buffer"]), cut - state["word_offset"])
+            for word in model_input[cut:]:
+                partial_output = resumed_streamer(word)
+                if partial_output is not None:
+                    self.assertIn(partial_output, " ".join(expected_output[state["word_offset"]:]))
+            actual_output = resumed_streamer.finalize()
+            self.assertEqual(actual_output, " ".join(expected_output[state["word_offset"]:]))
+
+    def test_set_state_with_other_chunk_size(self):
+        self.streamer("test " * 150)
+        state = self.streamer.get_state()
+        self.streamer.punct_fixer.word_chunk_size = 50
+        with self.assertRaises(IncompatibleStreamerState):
+            self.streamer.set_state(state)
+
 if __name__ == '__main__':
     unittest.main()